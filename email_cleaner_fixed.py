@@ -13,43 +13,87 @@ import csv
 import re
 import sys
 import html
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import chain, islice
+from queue import Empty, Full, Queue
 from urllib.parse import urlparse
-from bs4 import BeautifulSoup
+from html_utils import has_unclosed_tag, html_to_text
+import lxml.html
 import unicodedata
 
-# Increase CSV field size limit
-import sys
-maxInt = sys.maxsize
-while True:
-    try:
-        csv.field_size_limit(maxInt)
-        break
-    except OverflowError:
-        maxInt = int(maxInt/10)
+# Increase CSV field size limit (capped at the largest value a C long
+# accepts on Windows)
+csv.field_size_limit(min(sys.maxsize, 2**31 - 1))
+
+# Precompiled patterns used by EmailCleaner
+_TAG_RE = re.compile(r'<[^>]+>')
+_SCRIPT_RE = re.compile(r'<script[^>]*>.*?</script>', re.DOTALL | re.IGNORECASE)
+_STYLE_RE = re.compile(r'<style[^>]*>.*?</style>', re.DOTALL | re.IGNORECASE)
+_CSS_COMMENT_RE = re.compile(r'/\*.*?\*/', re.DOTALL)
+_URL_HTTP_RE = re.compile(r'https?://[^\s<>"{}|\\^`\[\]]+')
+_URL_WWW_RE = re.compile(r'www\.[^\s<>"{}|\\^`\[\]]+')
+_EMAIL_RE = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
+_PHONE_RE = re.compile(r'\b\d{3}[-.]?\d{3}[-.]?\d{4}\b')
+_LINK_MARKUP_RE = re.compile(r'\[link\].*?\[/link\]', re.IGNORECASE)
+_ANCHOR_RE = re.compile(r'<a[^>]*>.*?</a>', re.IGNORECASE)
+_SPACES_RE = re.compile(r' +')
+_BLANK_LINES_RE = re.compile(r'\n\s*\n')
+_BANG_RE = re.compile(r'[!]{2,}')
+_QMARK_RE = re.compile(r'[?]{2,}')
+_DOT_RE = re.compile(r'[.]{2,}')
+_COMMA_RE = re.compile(r',{2,}')
+_SUBJECT_PREFIX_RE = re.compile(r'^(RE|FWD|FW|FWD|RE:)\s*:?\s*', re.IGNORECASE)
+_ANGLE_EMAIL_RE = re.compile(r'<([^>]+)>')
+_SIG_SEPARATOR_RE = re.compile(r'^--[ \t]*\r?$\n?', re.MULTILINE)  # "-- " line on its own
+
+# Single-pass character translations used by EmailCleaner
+_WHITESPACE_TO_SPACE = str.maketrans('\r\t\v\f', '    ')
+_UNICODE_PUNCTUATION = str.maketrans({
+    '\u201c': '"',  # left double quote
+    '\u201d': '"',  # right double quote
+    '\u2018': "'",  # left single quote
+    '\u2019': "'",  # right single quote
+    '\u2014': '-',  # em dash
+    '\u2013': '-',  # en dash
+})
 
 class EmailCleaner:
     def __init__(self):
-        # Common email signatures and footers to remove
+        # Common email signatures and footers to remove (plain phrases)
+        self.signature_keywords = [
+            'Sent from my iPhone',
+            'Sent from my Android',
+            'Get Outlook for iOS',
+            'Get Outlook for Android',
+            'This email was sent from a notification-only address',
+            'Please do not reply to this email',
+            'To unsubscribe',
+            'Click here to unsubscribe',
+            'If you received this email in error',
+            'This is an automated message',
+            'Powered by',
+            'All rights reserved',
+            'Confidentiality Notice',
+            'This message is intended only for',
+            'If you are not the intended recipient',
+        ]
+        
+        # Signature markers that need a regular expression
         self.signature_patterns = [
-            r'--\s*\n',  # Email signature separator
-            r'Sent from my iPhone',
-            r'Sent from my Android',
-            r'Get Outlook for iOS',
-            r'Get Outlook for Android',
-            r'This email was sent from a notification-only address',
-            r'Please do not reply to this email',
-            r'To unsubscribe',
-            r'Click here to unsubscribe',
-            r'If you received this email in error',
-            r'This is an automated message',
-            r'Powered by',
             r'© \d{4}',
-            r'All rights reserved',
-            r'Confidentiality Notice',
-            r'This message is intended only for',
-            r'If you are not the intended recipient',
         ]
         
+        # Lowercased UTF-8 phrases, matched as plain substrings with bytes.find
+        self._sig_keyword_bytes = [k.lower().encode('utf-8') for k in self.signature_keywords]
+        
+        # Matches a whole line (and its newline) containing any pattern
+        self._sig_line_re = re.compile(
+            r'^.*(?:' + '|'.join(f'(?:{p})' for p in self.signature_patterns) + r').*$\n?',
+            re.IGNORECASE | re.MULTILINE)
+        
         # HTML entities to decode
         self.html_entities = {
             '&nbsp;': ' ',
@@ -60,6 +104,18 @@ class EmailCleaner:
             '&#39;': "'",
             '&apos;': "'",
         }
+        
+        # Cleaning steps applied in order by clean_email_text(), bound once
+        # here rather than looked up on every call
+        self._cleaning_steps = (
+            self.decode_html_entities,   # Step 1: Decode HTML entities
+            self.remove_html_tags,       # Step 2: Remove HTML tags
+            self.convert_links_to_text,  # Step 3: Convert links to "link"
+            self.remove_signatures,      # Step 4: Remove email signatures and footers
+            self.normalize_whitespace,   # Step 5: Clean whitespace and normalize
+            self.clean_punctuation,      # Step 6: Remove excessive punctuation
+            self.normalize_unicode,      # Step 7: Normalize unicode characters
+        )
     
     def clean_email_text(self, text):
         """Main cleaning function for email text."""
@@ -67,26 +123,8 @@ class EmailCleaner:
             return ""
         
         try:
-            # Step 1: Decode HTML entities
-            text = self.decode_html_entities(text)
-            
-            # Step 2: Remove HTML tags
-            text = self.remove_html_tags(text)
-            
-            # Step 3: Convert links to "link"
-            text = self.convert_links_to_text(text)
-            
-            # Step 4: Remove email signatures and footers
-            text = self.remove_signatures(text)
-            
-            # Step 5: Clean whitespace and normalize
-            text = self.normalize_whitespace(text)
-            
-            # Step 6: Remove excessive punctuation
-            text = self.clean_punctuation(text)
-            
-            # Step 7: Normalize unicode characters
-            text = self.normalize_unicode(text)
+            for step in self._cleaning_steps:
+                text = step(text)
             
             return text.strip()
         except Exception as e:
@@ -95,12 +133,15 @@ class EmailCleaner:
     
     def decode_html_entities(self, text):
         """Decode common HTML entities."""
+        # Plain text without markup or entities has nothing to decode
+        if '<' not in text and '&' not in text:
+            return text
+        
         # Use BeautifulSoup for comprehensive HTML entity decoding
         try:
             # Check if text looks like HTML
             if '<' in text and '>' in text:
-                soup = BeautifulSoup(text, 'html.parser')
-                text = soup.get_text()
+                text = html_to_text(text)
             else:
                 # Manual decoding for non-HTML text
                 for entity, replacement in self.html_entities.items():
@@ -112,65 +153,87 @@ class EmailCleaner:
         
         return text
     
-    def remove_html_tags(self, text):
+    @staticmethod
+    def remove_html_tags(text):
         """Remove HTML tags while preserving text content."""
-        # Remove HTML tags
-        text = re.sub(r'<[^>]+>', ' ', text)
-        
-        # Remove script and style content
-        text = re.sub(r'<script[^>]*>.*?</script>', '', text, flags=re.DOTALL | re.IGNORECASE)
-        text = re.sub(r'<style[^>]*>.*?</style>', '', text, flags=re.DOTALL | re.IGNORECASE)
+        # Tags, scripts and styles all need a '<' and a '>'
+        if '<' in text and '>' in text:
+            # lxml drops everything after an unclosed '<', so that case
+            # goes to the regexes, which only remove complete tags
+            tree = None
+            if not has_unclosed_tag(text):
+                try:
+                    tree = lxml.html.fromstring(text)
+                except Exception:
+                    tree = None
+            
+            if tree is not None:
+                # Drop script and style content, then join the remaining
+                # text nodes with spaces where the tags used to be
+                for bad in list(tree.iter('script', 'style')):
+                    bad.drop_tree()
+                text = ' '.join(tree.itertext())
+            else:
+                # Fallback for input lxml cannot (or should not) parse
+                text = _SCRIPT_RE.sub('', text)
+                text = _STYLE_RE.sub('', text)
+                text = _TAG_RE.sub(' ', text)
         
         # Remove CSS comments
-        text = re.sub(r'/\*.*?\*/', '', text, flags=re.DOTALL)
+        if '/*' in text:
+            text = _CSS_COMMENT_RE.sub('', text)
         
         return text
     
-    def convert_links_to_text(self, text):
+    @staticmethod
+    def convert_links_to_text(text):
         """Convert URLs and links to 'link' text."""
         # Convert HTTP/HTTPS URLs
-        text = re.sub(r'https?://[^\s<>"{}|\\^`\[\]]+', 'link', text)
+        text = _URL_HTTP_RE.sub('link', text)
         
         # Convert www URLs
-        text = re.sub(r'www\.[^\s<>"{}|\\^`\[\]]+', 'link', text)
+        text = _URL_WWW_RE.sub('link', text)
         
         # Convert email addresses to 'email'
-        text = re.sub(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', 'email', text)
+        text = _EMAIL_RE.sub('email', text)
         
         # Convert phone numbers to 'phone'
-        text = re.sub(r'\b\d{3}[-.]?\d{3}[-.]?\d{4}\b', 'phone', text)
+        text = _PHONE_RE.sub('phone', text)
         
         # Convert common link patterns
-        text = re.sub(r'\[link\].*?\[/link\]', 'link', text, flags=re.IGNORECASE)
-        text = re.sub(r'<a[^>]*>.*?</a>', 'link', text, flags=re.IGNORECASE)
+        text = _LINK_MARKUP_RE.sub('link', text)
+        if '<' in text:
+            text = _ANCHOR_RE.sub('link', text)
         
         return text
     
     def remove_signatures(self, text):
         """Remove common email signatures and footers."""
-        lines = text.split('\n')
-        cleaned_lines = []
+        # Find which signature phrases occur anywhere in the text first, so
+        # most emails never need a per-line scan
+        lowered = text.lower().encode('utf-8', errors='ignore')
+        keywords = [kw for kw in self._sig_keyword_bytes if lowered.find(kw) != -1]
         
-        for line in lines:
-            # Check if line matches signature patterns
-            is_signature = False
-            for pattern in self.signature_patterns:
-                if re.search(pattern, line, re.IGNORECASE):
-                    is_signature = True
-                    break
-            
-            if not is_signature:
-                cleaned_lines.append(line)
+        # Drop lines containing one of those phrases; lower() never adds or
+        # removes newlines, so lowered lines line up with the originals
+        if keywords:
+            text = '\n'.join(
+                line for line, lowered_line in zip(text.split('\n'), lowered.split(b'\n'))
+                if not any(lowered_line.find(kw) != -1 for kw in keywords))
         
-        return '\n'.join(cleaned_lines)
+        # Drop "-- " signature separator lines, then lines matching a pattern
+        text = _SIG_SEPARATOR_RE.sub('', text)
+        return self._sig_line_re.sub('', text)
     
-    def normalize_whitespace(self, text):
+    @staticmethod
+    def normalize_whitespace(text):
         """Normalize whitespace and remove excessive spacing."""
-        # Replace multiple spaces with single space
-        text = re.sub(r' +', ' ', text)
+        # Turn tabs, carriage returns and form feeds into spaces, then
+        # replace multiple spaces with single space
+        text = _SPACES_RE.sub(' ', text.translate(_WHITESPACE_TO_SPACE))
         
         # Replace multiple newlines with single newline
-        text = re.sub(r'\n\s*\n', '\n', text)
+        text = _BLANK_LINES_RE.sub('\n', text)
         
         # Remove leading/trailing whitespace from each line
         lines = [line.strip() for line in text.split('\n')]
@@ -180,31 +243,25 @@ class EmailCleaner:
         
         return '\n'.join(lines)
     
-    def clean_punctuation(self, text):
+    @staticmethod
+    def clean_punctuation(text):
         """Clean excessive punctuation."""
         # Remove multiple consecutive punctuation marks
-        text = re.sub(r'[!]{2,}', '!', text)
-        text = re.sub(r'[?]{2,}', '?', text)
-        text = re.sub(r'[.]{2,}', '.', text)
+        text = _BANG_RE.sub('!', text)
+        text = _QMARK_RE.sub('?', text)
+        text = _DOT_RE.sub('.', text)
         
         # Remove excessive commas
-        text = re.sub(r',{2,}', ',', text)
+        text = _COMMA_RE.sub(',', text)
         
         return text
     
-    def normalize_unicode(self, text):
+    @staticmethod
+    def normalize_unicode(text):
         """Normalize unicode characters."""
-        # Normalize unicode characters
-        text = unicodedata.normalize('NFKC', text)
-        
-        # Replace smart quotes with regular quotes
-        text = text.replace('"', '"').replace('"', '"')
-        text = text.replace(''', "'").replace(''', "'")
-        
-        # Replace em dashes and en dashes
-        text = text.replace('—', '-').replace('–', '-')
-        
-        return text
+        # Normalize unicode characters, then replace smart quotes and
+        # em/en dashes in one pass
+        return unicodedata.normalize('NFKC', text).translate(_UNICODE_PUNCTUATION)
     
     def clean_subject(self, subject):
         """Clean email subject line."""
@@ -212,7 +269,7 @@ class EmailCleaner:
             return "No Subject"
         
         # Remove common prefixes
-        subject = re.sub(r'^(RE|FWD|FW|FWD|RE:)\s*:?\s*', '', subject, flags=re.IGNORECASE)
+        subject = _SUBJECT_PREFIX_RE.sub('', subject)
         
         # Clean the subject
         subject = self.clean_email_text(subject)
@@ -225,9 +282,10 @@ class EmailCleaner:
             return "Unknown Sender"
         
         # Extract just the email address if it's in "Name <email>" format
-        email_match = re.search(r'<([^>]+)>', sender)
-        if email_match:
-            return email_match.group(1)
+        if '<' in sender:
+            email_match = _ANGLE_EMAIL_RE.search(sender)
+            if email_match:
+                return email_match.group(1)
         
         # If it's just an email address, return as is
         if '@' in sender:
@@ -235,12 +293,154 @@ class EmailCleaner:
         
         return sender
 
-def process_csv_file(input_file, output_file):
-    """Process a CSV file and clean all email content."""
-    cleaner = EmailCleaner()
+# Rows are read and cleaned in batches of BATCH_SIZE; files with fewer than
+# PARALLEL_MIN_ROWS rows are cleaned in-process to avoid pool start-up cost.
+BATCH_SIZE = 500
+PARALLEL_MIN_ROWS = 200
+
+# Read buffer for input CSV files (1 MiB)
+READ_BUFFER_SIZE = 1 << 20
+
+# Batches read ahead of the pool on a background thread, and batches kept
+# in flight in the pool, so reading, cleaning and writing overlap
+READ_AHEAD_BATCHES = 2
+IN_FLIGHT_BATCHES = 2
+
+# Subjects, senders and short bodies repeat a lot in real mailboxes
+# (newsletters, "Re:" threads, boilerplate footers), so cleaned values are
+# cached. Bodies of CACHE_MAX_BODY_LENGTH characters or more are not.
+CACHE_SIZE = 65536
+CACHE_MAX_BODY_LENGTH = 2048
+
+# Cleaner behind the cached helpers; each process creates its own
+_cleaner = None
+
+def _get_cleaner():
+    global _cleaner
+    if _cleaner is None:
+        _cleaner = EmailCleaner()
+    return _cleaner
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _clean_subject_cached(subject):
+    return _get_cleaner().clean_subject(subject)
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _clean_sender_cached(sender):
+    return _get_cleaner().clean_sender(sender)
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _clean_text_cached(text):
+    return _get_cleaner().clean_email_text(text)
+
+def clean_body(text):
+    """Clean an email body, caching the result for short bodies."""
+    # Short rows leave missing fields as None
+    if not text:
+        return ""
+    if len(text) < CACHE_MAX_BODY_LENGTH:
+        return _clean_text_cached(text)
+    return _get_cleaner().clean_email_text(text)
+
+def clean_row(row):
+    """Clean one CSV row. Returns (cleaned_row, None) or (None, error)."""
+    try:
+        cleaned_row = {
+            'subject': _clean_subject_cached(row.get('subject', '')),
+            'sender': _clean_sender_cached(row.get('sender', '')),
+            'body': clean_body(row.get('body', '')),
+            'date': row.get('date', '')
+        }
+        return cleaned_row, None
+    except Exception as e:
+        return None, e
+
+def _batches(rows, size):
+    """Yield lists of up to size rows."""
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+def _read_ahead(items, depth):
+    """Yield items, producing up to depth of them ahead on a background thread.
+    
+    Exceptions raised while producing are re-raised in the consumer.
+    """
+    queue = Queue(maxsize=depth)
+    stop = threading.Event()
+    done = object()
     
+    def put(item):
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+    
+    def produce():
+        try:
+            for item in items:
+                if not put((item, None)):
+                    return
+        except Exception as e:
+            put((None, e))
+            return
+        put((done, None))
+    
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    
+    try:
+        while True:
+            try:
+                item, error = queue.get(timeout=0.1)
+            except Empty:
+                if not thread.is_alive() and queue.empty():
+                    return
+                continue
+            if error is not None:
+                raise error
+            if item is done:
+                return
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+def clean_rows(rows, workers=None):
+    """Clean CSV rows, yielding clean_row() results in input order.
+    
+    Small inputs are cleaned in this process; larger ones are spread over a
+    pool of worker processes (os.cpu_count() unless workers is given).
+    """
+    batches = _batches(rows, BATCH_SIZE)
+    first_batch = next(batches, [])
+    
+    if workers == 1 or len(first_batch) < PARALLEL_MIN_ROWS:
+        for row in chain(first_batch, chain.from_iterable(batches)):
+            yield clean_row(row)
+        return
+    
+    # Read the CSV on a background thread and keep a few batches queued in
+    # the pool, so workers stay busy while results are written
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        in_flight = deque()
+        for batch in _read_ahead(chain([first_batch], batches), READ_AHEAD_BATCHES):
+            in_flight.append(executor.map(clean_row, batch, chunksize=64))
+            if len(in_flight) >= IN_FLIGHT_BATCHES:
+                yield from in_flight.popleft()
+        while in_flight:
+            yield from in_flight.popleft()
+
+def process_csv_file(input_file, output_file, workers=None):
+    """Process a CSV file and clean all email content."""
     try:
-        with open(input_file, 'r', encoding='utf-8', errors='ignore') as infile, \
+        with open(input_file, 'r', encoding='utf-8', errors='ignore', buffering=READ_BUFFER_SIZE) as infile, \
              open(output_file, 'w', newline='', encoding='utf-8') as outfile:
             
             reader = csv.DictReader(infile)
@@ -251,15 +451,10 @@ def process_csv_file(input_file, output_file):
             processed = 0
             skipped = 0
             
-            for row_num, row in enumerate(reader, 1):
+            for row_num, (cleaned_row, error) in enumerate(clean_rows(reader, workers), 1):
                 try:
-                    # Clean each field
-                    cleaned_row = {
-                        'subject': cleaner.clean_subject(row.get('subject', '')),
-                        'sender': cleaner.clean_sender(row.get('sender', '')),
-                        'body': cleaner.clean_email_text(row.get('body', '')),
-                        'date': row.get('date', '')
-                    }
+                    if error is not None:
+                        raise error
                     
                     writer.writerow(cleaned_row)
                     processed += 1
@@ -20,12 +20,14 @@ import csv
 import base64
 import email
 import re
+import time
 from datetime import datetime
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+import httplib2
 
 # Gmail API scopes
 SCOPES = ['https://www.googleapis.com/auth/gmail.readonly']
@@ -34,6 +36,22 @@ SCOPES = ['https://www.googleapis.com/auth/gmail.readonly']
 EMAIL_SEPARATOR = "===EMAIL_START==="
 EMAIL_END_SEPARATOR = "===EMAIL_END==="
 
+# Messages fetched per batched API request (Gmail allows up to 100)
+FETCH_BATCH_SIZE = 50
+
+# Retry rounds for messages that failed inside a batch with a rate limit,
+# server or transport error; all of them are re-sent as one batch per
+# round, and the delay doubles before each round
+FETCH_RETRIES = 3
+FETCH_RETRY_DELAY = 1  # seconds
+
+# Precompiled patterns used by clean_text()
+_CRLF_RE = re.compile(r'\r\n')
+_CR_RE = re.compile(r'\r')
+_NEWLINES_RE = re.compile(r'\n+')
+_NON_PRINTABLE_RE = re.compile(r'[^\x20-\x7E\n\t]')
+_SPACES_RE = re.compile(r' +')
+
 def authenticate_gmail():
     """Authenticate with Gmail API."""
     creds = None
@@ -63,51 +81,127 @@ def clean_text(text):
         return ""
     
     # Remove extra whitespace and normalize line breaks
-    text = re.sub(r'\r\n', '\n', text)
-    text = re.sub(r'\r', '\n', text)
-    text = re.sub(r'\n+', '\n', text)
+    text = _CRLF_RE.sub('\n', text)
+    text = _CR_RE.sub('\n', text)
+    text = _NEWLINES_RE.sub('\n', text)
     
     # Remove non-printable characters except newlines and tabs
-    text = re.sub(r'[^\x20-\x7E\n\t]', '', text)
+    text = _NON_PRINTABLE_RE.sub('', text)
     
     # Clean up multiple spaces
-    text = re.sub(r' +', ' ', text)
+    text = _SPACES_RE.sub(' ', text)
     
     text = text.strip()
     
     return text
 
+def parse_email_message(message):
+    """Extract email content from a Gmail message resource."""
+    # Extract headers
+    headers = message['payload']['headers']
+    subject = next((h['value'] for h in headers if h['name'] == 'Subject'), 'No Subject')
+    sender = next((h['value'] for h in headers if h['name'] == 'From'), 'Unknown Sender')
+    date = next((h['value'] for h in headers if h['name'] == 'Date'), '')
+    
+    # Clean headers
+    subject = clean_text(subject)
+    sender = clean_text(sender)
+    date = clean_text(date)
+    
+    # Extract body
+    body = extract_body(message['payload'])
+    body = clean_text(body)
+    
+    return {
+        'subject': subject,
+        'sender': sender,
+        'body': body,
+        'date': date
+    }
+
 def get_email_content(service, message_id):
     """Extract email content from Gmail message."""
     try:
         message = service.users().messages().get(
             userId='me', id=message_id, format='full').execute()
-        
-        # Extract headers
-        headers = message['payload']['headers']
-        subject = next((h['value'] for h in headers if h['name'] == 'Subject'), 'No Subject')
-        sender = next((h['value'] for h in headers if h['name'] == 'From'), 'Unknown Sender')
-        date = next((h['value'] for h in headers if h['name'] == 'Date'), '')
-        
-        # Clean headers
-        subject = clean_text(subject)
-        sender = clean_text(sender)
-        date = clean_text(date)
-        
-        # Extract body
-        body = extract_body(message['payload'])
-        body = clean_text(body)
-        
-        return {
-            'subject': subject,
-            'sender': sender,
-            'body': body,
-            'date': date
-        }
+        return parse_email_message(message)
     except Exception as e:
         print(f"Error extracting email {message_id}: {e}")
         return None
 
+def is_retryable_error(error):
+    """Return True for errors worth retrying: 429, 5xx and transport failures."""
+    if isinstance(error, HttpError):
+        return error.resp.status == 429 or error.resp.status >= 500
+    return isinstance(error, (OSError, httplib2.HttpLib2Error))
+
+def fetch_email_batch(service, message_ids, emails):
+    """Fetch message_ids in one batched request, adding parsed results to emails.
+    
+    Returns the IDs that failed with a retryable error. Messages that fail
+    for other reasons (e.g. 404, or a parse error) are reported and skipped.
+    """
+    answered = set()
+    retry_ids = []
+    
+    def collect(message_id, message, exception):
+        answered.add(message_id)
+        if exception is not None:
+            print(f"Error extracting email {message_id}: {exception}")
+            if is_retryable_error(exception):
+                retry_ids.append(message_id)
+            return
+        try:
+            emails[message_id] = parse_email_message(message)
+        except Exception as e:
+            print(f"Error extracting email {message_id}: {e}")
+    
+    batch = service.new_batch_http_request(callback=collect)
+    for message_id in message_ids:
+        batch.add(
+            service.users().messages().get(userId='me', id=message_id, format='full'),
+            request_id=message_id)
+    
+    try:
+        batch.execute()
+    except Exception as error:
+        print(f"Batch request failed: {error}")
+        if is_retryable_error(error):
+            retry_ids.extend(message_id for message_id in message_ids
+                             if message_id not in answered)
+    
+    return retry_ids
+
+def get_emails_content(service, messages):
+    """Extract content for many messages using batched API requests.
+    
+    Messages are fetched FETCH_BATCH_SIZE at a time in a single HTTP round
+    trip each. Messages that hit a rate limit, server or transport error
+    are re-sent together in up to FETCH_RETRIES backed-off rounds. Results
+    keep the order of messages; messages that still fail are skipped.
+    """
+    emails = {}
+    
+    for start in range(0, len(messages), FETCH_BATCH_SIZE):
+        chunk = messages[start:start + FETCH_BATCH_SIZE]
+        print(f"Processing emails {start + 1}-{start + len(chunk)}/{len(messages)}")
+        
+        pending = fetch_email_batch(service, [message['id'] for message in chunk], emails)
+        
+        delay = FETCH_RETRY_DELAY
+        for attempt in range(FETCH_RETRIES):
+            if not pending:
+                break
+            print(f"Retrying {len(pending)} emails in {delay}s...")
+            time.sleep(delay)
+            delay *= 2
+            pending = fetch_email_batch(service, pending, emails)
+        
+        for message_id in pending:
+            print(f"Giving up on email {message_id}")
+    
+    return [emails[message['id']] for message in messages if message['id'] in emails]
+
 def extract_body(payload):
     """Recursively extract email body from payload."""
     if 'body' in payload and payload['body'].get('data'):
@@ -147,12 +241,7 @@ def export_folder_emails(service, folder_name, query, max_results, output_file):
         print(f"No emails found in {folder_name}")
         return
     
-    emails = []
-    for i, message in enumerate(messages):
-        print(f"Processing email {i+1}/{len(messages)}")
-        email_data = get_email_content(service, message['id'])
-        if email_data:
-            emails.append(email_data)
+    emails = get_emails_content(service, messages)
     
     # Save to CSV with simple format
     with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+HTML Helpers for the Email Cleaners
+
+Shared by clean_email_content.py and email_cleaner_fixed.py so both
+extract text from email HTML the same way.
+"""
+
+from bs4 import BeautifulSoup
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+def has_unclosed_tag(text):
+    """Return True if the last '<' in text is never closed by a '>'."""
+    return text.rfind('<') > text.rfind('>')
+
+def make_soup(text):
+    """Parse HTML with lxml, falling back to html.parser for bad fragments."""
+    # lxml drops everything after a '<' that is never closed (e.g. "x<y"),
+    # while html.parser keeps it as text
+    if has_unclosed_tag(text):
+        return BeautifulSoup(text, 'html.parser')
+    try:
+        return BeautifulSoup(text, 'lxml')
+    except Exception:
+        return BeautifulSoup(text, 'html.parser')
+
+def html_to_text(text):
+    """Extract the text of an HTML document, dropping scripts and styles."""
+    # lexbor also swallows text after an unclosed '<', so such input goes
+    # through make_soup()'s html.parser path instead
+    if LexborHTMLParser is not None and not has_unclosed_tag(text):
+        tree = LexborHTMLParser(text)
+        tree.strip_tags(['script', 'style'])
+        return tree.text()
+    
+    soup = make_soup(text)
+    for script in soup(["script", "style"]):
+        script.decompose()
+    return soup.get_text()
@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+"""
+Regression checks for the email cleaners.
+
+Run with:
+python -m pytest test_email_cleaners.py
+"""
+
+from clean_email_content import clean_email_content
+from email_cleaner_fixed import EmailCleaner
+
+def test_stray_less_than_in_plain_text_is_kept():
+    """A '<' that never starts a tag must not swallow the rest of the text."""
+    cleaner = EmailCleaner()
+    
+    assert cleaner.clean_email_text('if a<b then c\nmore') == 'if a<b then c\nmore'
+    assert cleaner.clean_subject('Fwd: x<y') == 'x<y'
+    assert cleaner.clean_email_text('text with <unclosed tag and then\nmany lines\nof content') == \
+        'text with <unclosed tag and then\nmany lines\nof content'
+    
+    assert clean_email_content('x<y\nline two') == 'x<y line two'
+    assert clean_email_content('<p>a</p> b, x<y rest\nmore') == 'a b, x<y rest more'
+
+def test_html_tags_are_still_removed():
+    cleaner = EmailCleaner()
+    
+    assert cleaner.clean_email_text('<p>Hello <b>there</b></p><script>x()</script>') == 'Hello there'
+    assert clean_email_content('<p>Hello <b>there</b></p><script>x()</script>') == 'Hello there'